@@ -1,11 +1,20 @@
 ﻿from __future__ import annotations
 
 import argparse
+import getpass
+import json
+import os
 import re
 import shutil
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import chain
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple
 from urllib.parse import parse_qs, urlparse
 
 import yt_dlp
@@ -17,17 +26,41 @@ from rich.table import Table
 
 BASE_DIR = Path(__file__).resolve().parent
 OUTPUT_DIR = BASE_DIR / "output"
+# The video id keeps same-titled videos that download in parallel from sharing
+# (and resuming onto) one another's partial files.
+OUTPUT_TEMPLATE = os.fspath(OUTPUT_DIR / "%(title).200B [%(id)s].%(ext)s")
 SYSTEM_DIR = BASE_DIR / "system"
+COOKIE_CACHE_FILE = SYSTEM_DIR / "cookie_source.json"
+COOKIE_CACHE_TTL_SECONDS = 6 * 60 * 60
 
 DEFAULT_BROWSERS = ("edge", "chrome", "firefox", "brave", "opera", "vivaldi")
+COOKIE_PROBE_BATCH_SIZE = 3
 VIDEO_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{11}$")
+URL_SPLIT_PATTERN = re.compile(r"[\s,]+")
+URL_TRIM_PATTERN = re.compile(r"^[\s\"'<>\[\](){},]+|[\s\"'<>\[\](){},]+$")
+SCHEMELESS_URL_PATTERN = re.compile(r"^(?:www\.youtube\.com|youtube\.com|youtu\.be)/")
+FAST_VIDEO_URL_PATTERN = re.compile(
+    r"^(?:https?://)?(?:"
+    r"(?:www\.)?youtube\.com/(?:watch\?v=([A-Za-z0-9_-]{11})(?:[&#].*)?|(?:shorts|embed|live)/([A-Za-z0-9_-]{11})(?:[/?#].*)?)"
+    r"|youtu\.be/([A-Za-z0-9_-]{11})(?:[/?#].*)?"
+    r")$"
+)
 VALID_VIDEO_EXTENSIONS = {".mp4", ".mkv", ".webm", ".mov"}
+MAX_PARALLEL_DOWNLOADS = 4
+BYTE_UNITS = ("B", "KB", "MB", "GB", "TB")
+PROGRESS_UPDATE_INTERVAL = 0.1
+RESULT_POLL_INTERVAL = 0.5
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
     "AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/131.0.0.0 Safari/537.36"
 )
 
+OUTPUT_SCAN_LOCK = threading.Lock()
+# yt-dlp reads cookies.txt on first use and truncates and rewrites it on close().
+COOKIE_FILE_LOCK = threading.Lock()
+STOP_DOWNLOADS = threading.Event()
+
 
 class _SilentYDLLogger:
     def debug(self, _: str) -> None:
@@ -76,6 +109,11 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Start downloads without the interactive confirmation prompt.",
     )
+    parser.add_argument(
+        "--refresh-cookies",
+        action="store_true",
+        help="Ignore the cached cookie detection result and probe browsers again.",
+    )
     return parser.parse_args()
 
 
@@ -84,15 +122,21 @@ def ensure_runtime_folders() -> None:
     SYSTEM_DIR.mkdir(parents=True, exist_ok=True)
 
 
+@lru_cache(maxsize=4096)
 def normalize_video_url(raw_url: str) -> str:
-    value = (raw_url or "").strip().strip('"').strip("'").strip(",")
+    value = URL_TRIM_PATTERN.sub("", raw_url or "")
     if not value:
         return ""
 
     if VIDEO_ID_PATTERN.fullmatch(value):
         return f"https://www.youtube.com/watch?v={value}"
 
-    if value.startswith("youtube.com/") or value.startswith("youtu.be/") or value.startswith("www.youtube.com/"):
+    # Canonical watch/short links skip urlparse; anything unusual takes the general path below.
+    fast_match = FAST_VIDEO_URL_PATTERN.match(value)
+    if fast_match:
+        return f"https://www.youtube.com/watch?v={fast_match.group(1) or fast_match.group(2) or fast_match.group(3)}"
+
+    if SCHEMELESS_URL_PATTERN.match(value):
         value = f"https://{value}"
 
     try:
@@ -127,36 +171,40 @@ def normalize_video_url(raw_url: str) -> str:
     return ""
 
 
-def extract_urls(raw_text: str) -> List[str]:
-    candidates: List[str] = []
-    for piece in re.split(r"[\s,]+", raw_text or ""):
-        cleaned = piece.strip().strip('"').strip("'").strip("<>").strip("[](){}")
+def iter_video_urls(raw_text: str) -> Iterator[str]:
+    for piece in URL_SPLIT_PATTERN.split(raw_text or ""):
+        cleaned = URL_TRIM_PATTERN.sub("", piece)
         if not cleaned:
             continue
         normalized = normalize_video_url(cleaned)
         if normalized:
-            candidates.append(normalized)
+            yield normalized
 
-    seen: set[str] = set()
-    deduped: List[str] = []
-    for url in candidates:
-        if url in seen:
-            continue
-        seen.add(url)
-        deduped.append(url)
-    return deduped
+
+def iter_video_urls_from_file(path: Path) -> Iterator[str]:
+    with path.open("r", encoding="utf-8", buffering=1 << 16) as handle:
+        for line in handle:
+            yield from iter_video_urls(line)
+
+
+def unique_urls(candidates: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(candidates))
+
+
+def extract_urls(raw_text: str) -> List[str]:
+    return unique_urls(iter_video_urls(raw_text))
 
 
-def collect_raw_input(console: Console, args: argparse.Namespace) -> str:
-    chunks: List[str] = []
+def collect_urls(console: Console, args: argparse.Namespace) -> List[str]:
+    sources: List[Iterable[str]] = []
     if args.links_file:
         if not args.links_file.exists():
             raise FileNotFoundError(f"Links file does not exist: {args.links_file}")
-        chunks.append(args.links_file.read_text(encoding="utf-8"))
+        sources.append(iter_video_urls_from_file(args.links_file))
     if args.urls:
-        chunks.append(" ".join(args.urls))
-    if chunks:
-        return "\n".join(chunks)
+        sources.append(iter_video_urls(" ".join(args.urls)))
+    if sources:
+        return unique_urls(chain.from_iterable(sources))
 
     console.print(
         Panel.fit(
@@ -173,10 +221,14 @@ def collect_raw_input(console: Console, args: argparse.Namespace) -> str:
         if not line:
             break
         lines.append(line)
-    return "\n".join(lines)
+    return extract_urls("\n".join(lines))
 
 
 def _to_int(value: Any) -> int:
+    if type(value) is int:
+        return value
+    if value is None:
+        return 0
     try:
         return int(value)
     except Exception:
@@ -184,6 +236,10 @@ def _to_int(value: Any) -> int:
 
 
 def _to_float(value: Any) -> float:
+    if type(value) is float:
+        return value
+    if value is None:
+        return 0.0
     try:
         return float(value)
     except Exception:
@@ -226,8 +282,7 @@ def choose_download_format(extracted_info: Dict[str, Any]) -> Tuple[str, str]:
             progressive.append(fmt)
 
     if video_only:
-        video_only.sort(key=_stream_sort_key, reverse=True)
-        best = video_only[0]
+        best = max(video_only, key=_stream_sort_key)
         fmt_id = str(best["format_id"])
         height = _to_int(best.get("height"))
         return (
@@ -236,8 +291,7 @@ def choose_download_format(extracted_info: Dict[str, Any]) -> Tuple[str, str]:
         )
 
     if progressive:
-        progressive.sort(key=_stream_sort_key, reverse=True)
-        best = progressive[0]
+        best = max(progressive, key=_stream_sort_key)
         fmt_id = str(best["format_id"])
         height = _to_int(best.get("height"))
         return fmt_id, f"progressive {height}p"
@@ -278,24 +332,96 @@ def browser_cookie_source_is_valid(browser: str) -> bool:
     return False
 
 
-def detect_cookie_source() -> CookieSource:
+def _current_user() -> str:
+    try:
+        return getpass.getuser()
+    except Exception:
+        return ""
+
+
+def read_cached_cookie_source() -> Optional[CookieSource]:
+    try:
+        age = time.time() - COOKIE_CACHE_FILE.stat().st_mtime
+        if age > COOKIE_CACHE_TTL_SECONDS:
+            return None
+        cached = json.loads(COOKIE_CACHE_FILE.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+    if not isinstance(cached, dict) or cached.get("user") != _current_user():
+        return None
+
+    # Only guards against a malformed cache entry; whether the browser profile still
+    # exists is not checked, yt-dlp reports that when it loads the cookies.
+    browser = cached.get("browser")
+    if cached.get("mode") == "browser" and browser in DEFAULT_BROWSERS:
+        return CookieSource(
+            mode="browser",
+            value=(browser,),
+            description=f"browser cookies: {browser} (cached)",
+        )
+    return None
+
+
+def write_cached_cookie_source(cookie_source: CookieSource) -> None:
+    # A failed probe can be a network error or rate limiting rather than a missing
+    # browser, so negative results are never cached and clear any earlier entry.
+    if cookie_source.mode != "browser" or not cookie_source.value:
+        try:
+            COOKIE_CACHE_FILE.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return
+
+    payload = {
+        "user": _current_user(),
+        "mode": cookie_source.mode,
+        "browser": cookie_source.value[0],
+    }
+    tmp_file = COOKIE_CACHE_FILE.with_name(f"{COOKIE_CACHE_FILE.name}.tmp")
+    try:
+        tmp_file.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp_file, COOKIE_CACHE_FILE)
+    except OSError:
+        return
+
+
+def detect_cookie_source(refresh: bool = False) -> CookieSource:
     cookie_file = find_cookie_file()
     if cookie_file:
         return CookieSource(
             mode="file",
-            value=str(cookie_file),
+            value=os.fspath(cookie_file),
             description=f"cookie file: {cookie_file}",
         )
 
-    for browser in DEFAULT_BROWSERS:
-        if browser_cookie_source_is_valid(browser):
-            return CookieSource(
-                mode="browser",
-                value=(browser,),
-                description=f"browser cookies: {browser}",
-            )
+    if not refresh:
+        cached = read_cached_cookie_source()
+        if cached is not None:
+            return cached
 
-    return CookieSource(mode="none", value=None, description="no cookies detected")
+    cookie_source = CookieSource(mode="none", value=None, description="no cookies detected")
+    # Probe browsers in priority-ordered batches and read each batch in priority order,
+    # so detection returns once the best browser is known to work. Lower-priority probes
+    # of that batch finish in the background; later batches are never started.
+    executor = ThreadPoolExecutor(max_workers=COOKIE_PROBE_BATCH_SIZE)
+    try:
+        for start in range(0, len(DEFAULT_BROWSERS), COOKIE_PROBE_BATCH_SIZE):
+            batch = DEFAULT_BROWSERS[start : start + COOKIE_PROBE_BATCH_SIZE]
+            probes = [executor.submit(browser_cookie_source_is_valid, browser) for browser in batch]
+            browser = next((browser for browser, probe in zip(batch, probes) if probe.result()), None)
+            if browser is not None:
+                cookie_source = CookieSource(
+                    mode="browser",
+                    value=(browser,),
+                    description=f"browser cookies: {browser}",
+                )
+                break
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    write_cached_cookie_source(cookie_source)
+    return cookie_source
 
 
 def apply_cookie_source(ydl_opts: Dict[str, Any], cookie_source: CookieSource, use_cookies: bool) -> None:
@@ -305,40 +431,46 @@ def apply_cookie_source(ydl_opts: Dict[str, Any], cookie_source: CookieSource, u
         return
 
     if cookie_source.mode == "file" and cookie_source.value:
-        ydl_opts["cookiefile"] = str(cookie_source.value)
+        ydl_opts["cookiefile"] = cookie_source.value
     elif cookie_source.mode == "browser" and cookie_source.value:
         ydl_opts["cookiesfrombrowser"] = cookie_source.value
 
 
-def download_strategies() -> List[Dict[str, Any]]:
-    return [
+DOWNLOAD_STRATEGIES: Tuple[Mapping[str, Any], ...] = (
+    MappingProxyType(
         {
             "name": "cookies-desktop-clients",
             "use_cookies": True,
             "extractor_args": {"youtube": {"player_client": ["tv_downgraded", "web", "web_safari"]}},
-        },
+        }
+    ),
+    MappingProxyType(
         {
             "name": "cookies-mobile-clients",
             "use_cookies": True,
             "extractor_args": {"youtube": {"player_client": ["ios_downgraded", "android_vr", "web"]}},
-        },
+        }
+    ),
+    MappingProxyType(
         {
             "name": "no-cookies-mobile",
             "use_cookies": False,
             "extractor_args": {"youtube": {"player_client": ["ios_downgraded", "android_vr"]}},
-        },
+        }
+    ),
+    MappingProxyType(
         {
             "name": "no-cookies-default",
             "use_cookies": False,
             "extractor_args": {"youtube": {"player_client": ["android", "web"]}},
-        },
-    ]
-
+        }
+    ),
+)
 
-def base_download_options() -> Dict[str, Any]:
-    return {
+BASE_DOWNLOAD_OPTIONS: Mapping[str, Any] = MappingProxyType(
+    {
         "merge_output_format": "mp4",
-        "outtmpl": str(OUTPUT_DIR / "%(title).200B.%(ext)s"),
+        "outtmpl": OUTPUT_TEMPLATE,
         "quiet": True,
         "noprogress": True,
         "noplaylist": True,
@@ -349,39 +481,51 @@ def base_download_options() -> Dict[str, Any]:
         "ignoreerrors": False,
         "allow_unplayable_formats": False,
         "ignoreconfig": True,
-        "http_headers": {
-            "User-Agent": USER_AGENT,
-            "Accept-Language": "en-us,en;q=0.5",
-        },
-        "postprocessors": [{"key": "FFmpegVideoConvertor", "preferedformat": "mp4"}],
+        "http_headers": MappingProxyType(
+            {
+                "User-Agent": USER_AGENT,
+                "Accept-Language": "en-us,en;q=0.5",
+            }
+        ),
+        "postprocessors": (MappingProxyType({"key": "FFmpegVideoConvertor", "preferedformat": "mp4"}),),
         "logger": _SilentYDLLogger(),
     }
+)
 
 
-def snapshot_output_folder() -> Dict[str, int]:
-    snapshot: Dict[str, int] = {}
-    for path in OUTPUT_DIR.glob("*"):
-        if path.is_file():
-            snapshot[str(path.resolve())] = path.stat().st_size
+def _file_identity(entry: os.DirEntry, stat: os.stat_result) -> Tuple[int, int]:
+    # DirEntry.stat() leaves st_ino at zero on Windows; DirEntry.inode() fills it in.
+    return stat.st_dev, entry.inode()
+
+
+def snapshot_output_folder() -> Dict[Tuple[int, int], int]:
+    snapshot: Dict[Tuple[int, int], int] = {}
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                snapshot[_file_identity(entry, stat)] = stat.st_size
     return snapshot
 
 
-def find_new_video_files(before: Dict[str, int]) -> List[Path]:
-    created: List[Path] = []
-    for path in OUTPUT_DIR.glob("*"):
-        if not path.is_file():
-            continue
-        if path.suffix.lower() not in VALID_VIDEO_EXTENSIONS:
-            continue
-        if path.suffix.lower() in {".part", ".ytdl"}:
-            continue
+def find_new_video_files(before: Dict[Tuple[int, int], int]) -> List[Path]:
+    created: List[Tuple[float, str]] = []
+    with os.scandir(OUTPUT_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            name = entry.name
+            dot = name.rfind(".")
+            suffix = name[dot:].lower() if dot > 0 else ""
+            if suffix not in VALID_VIDEO_EXTENSIONS:
+                continue
 
-        resolved = str(path.resolve())
-        size = path.stat().st_size
-        if resolved not in before or before[resolved] != size:
-            created.append(path)
-    created.sort(key=lambda item: item.stat().st_mtime, reverse=True)
-    return created
+            stat = entry.stat()
+            identity = _file_identity(entry, stat)
+            if identity not in before or before[identity] != stat.st_size:
+                created.append((stat.st_mtime, entry.path))
+    created.sort(reverse=True)
+    return [Path(path) for _, path in created]
 
 
 def resolve_output_from_info(info: Any) -> Optional[Path]:
@@ -416,23 +560,6 @@ def resolve_output_from_info(info: Any) -> Optional[Path]:
     return None
 
 
-def probe_format(url: str, ydl_opts: Dict[str, Any]) -> Tuple[str, str]:
-    probe_opts = dict(ydl_opts)
-    probe_opts.update(
-        {
-            "skip_download": True,
-            "quiet": True,
-            "no_warnings": True,
-            "noplaylist": True,
-        }
-    )
-    with yt_dlp.YoutubeDL(probe_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-    if not isinstance(info, dict):
-        return "bestvideo*+bestaudio/bestvideo+bestaudio/best", "generic-best"
-    return choose_download_format(info)
-
-
 def summarize_exception(exc: Exception) -> str:
     text = str(exc).strip()
     if not text:
@@ -444,17 +571,14 @@ def summarize_exception(exc: Exception) -> str:
 
 
 def format_bytes(value: Any) -> str:
-    size = _to_float(value)
+    size = _to_int(value)
     if size <= 0:
         return "0 B"
-    units = ("B", "KB", "MB", "GB", "TB")
-    unit_index = 0
-    while size >= 1024 and unit_index < len(units) - 1:
-        size /= 1024.0
-        unit_index += 1
+    # Each unit step is 2**10, so the bit length picks the unit without a division loop.
+    unit_index = min((size.bit_length() - 1) // 10, len(BYTE_UNITS) - 1)
     if unit_index == 0:
-        return f"{int(size)} {units[unit_index]}"
-    return f"{size:.1f} {units[unit_index]}"
+        return f"{size} B"
+    return f"{size / (1 << (unit_index * 10)):.1f} {BYTE_UNITS[unit_index]}"
 
 
 def format_eta(seconds: Any) -> str:
@@ -469,9 +593,17 @@ def format_eta(seconds: Any) -> str:
 
 
 def create_progress_hook(progress: Progress, task_id: int, strategy_name: str) -> Callable[[Dict[str, Any]], None]:
+    last_update = 0.0
+
     def hook(data: Dict[str, Any]) -> None:
+        nonlocal last_update
         status = data.get("status")
         if status == "downloading":
+            now = time.monotonic()
+            if now - last_update < PROGRESS_UPDATE_INTERVAL:
+                return
+            last_update = now
+
             downloaded = _to_float(data.get("downloaded_bytes"))
             total = _to_float(data.get("total_bytes") or data.get("total_bytes_estimate"))
             speed_text = f"{format_bytes(data.get('speed'))}/s" if data.get("speed") else "-"
@@ -499,8 +631,11 @@ def create_progress_hook(progress: Progress, task_id: int, strategy_name: str) -
                     eta=eta_text,
                 )
         elif status == "finished":
+            # The throttle may have skipped the last "downloading" tick, so fill the bar here.
             progress.update(
                 task_id,
+                total=100,
+                completed=100,
                 description=f"[yellow]Download complete, merging ({strategy_name})...[/yellow]",
                 percent="100.0%",
                 speed="-",
@@ -511,95 +646,134 @@ def create_progress_hook(progress: Progress, task_id: int, strategy_name: str) -
 
 
 def download_video(url: str, cookie_source: CookieSource, progress: Progress, task_id: int) -> DownloadResult:
-    before = snapshot_output_folder()
+    with OUTPUT_SCAN_LOCK:
+        before = snapshot_output_folder()
     last_error = "unknown download error"
 
-    for strategy in download_strategies():
-        progress.update(
-            task_id,
-            total=100,
-            completed=0,
-            description=f"[cyan]Preparing strategy: {strategy['name']}[/cyan]",
-            percent="  0.0%",
-            speed="-",
-            eta="-",
-        )
-
-        ydl_opts = dict(base_download_options())
-        extractor_args = strategy.get("extractor_args")
-        if extractor_args:
-            ydl_opts["extractor_args"] = extractor_args
+    # Strategies only differ in extractor args (read live from params) and cookies,
+    # which yt-dlp binds to its cookie jar on first use, so keep one instance per
+    # distinct cookie setup and share it between the strategies that use it.
+    downloaders: Dict[Tuple[Any, Any], yt_dlp.YoutubeDL] = {}
+    current_hook: List[Callable[[Dict[str, Any]], None]] = []
 
-        apply_cookie_source(ydl_opts, cookie_source, use_cookies=bool(strategy.get("use_cookies", True)))
+    def forward_progress(data: Dict[str, Any]) -> None:
+        # Worker threads cannot be interrupted directly; aborting from the hook
+        # lets Ctrl+C stop a download at its next chunk.
+        if STOP_DOWNLOADS.is_set():
+            raise yt_dlp.utils.DownloadCancelled("download stopped by user")
+        if current_hook:
+            current_hook[0](data)
 
-        try:
-            selected_format, format_strategy = probe_format(url, ydl_opts)
-            ydl_opts["format"] = selected_format
-        except Exception as exc:
-            selected_format = "bestvideo*+bestaudio/bestvideo+bestaudio/best"
-            format_strategy = "generic-best"
-            last_error = f"format probe failed: {summarize_exception(exc)}"
-            ydl_opts["format"] = selected_format
-
-        strategy_name = f"{strategy['name']} | {format_strategy}"
-        ydl_opts["progress_hooks"] = [create_progress_hook(progress, task_id, strategy_name)]
-        progress.update(
-            task_id,
-            description=f"[cyan]Starting download ({strategy_name})[/cyan]",
-            percent="  0.0%",
-            speed="-",
-            eta="-",
-            total=100,
-            completed=0,
-        )
-
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-        except Exception as exc:
-            last_error = summarize_exception(exc)
+    try:
+        for strategy in DOWNLOAD_STRATEGIES:
+            if STOP_DOWNLOADS.is_set():
+                last_error = "download stopped by user"
+                break
             progress.update(
                 task_id,
-                description=f"[yellow]Retrying with next strategy after error: {last_error}[/yellow]",
+                total=100,
+                completed=0,
+                description=f"[cyan]Preparing strategy: {strategy['name']}[/cyan]",
                 percent="  0.0%",
                 speed="-",
                 eta="-",
-                total=100,
-                completed=0,
             )
-            continue
 
-        new_files = find_new_video_files(before)
-        output_file = new_files[0] if new_files else resolve_output_from_info(info)
-        if output_file is None:
-            last_error = "yt-dlp finished but no output file was created"
-            continue
+            ydl_opts = dict(BASE_DOWNLOAD_OPTIONS)
+            apply_cookie_source(ydl_opts, cookie_source, use_cookies=bool(strategy.get("use_cookies", True)))
+            cookie_key = (ydl_opts.get("cookiefile"), ydl_opts.get("cookiesfrombrowser"))
+
+            try:
+                ydl = downloaders.get(cookie_key)
+                if ydl is None:
+                    ydl = yt_dlp.YoutubeDL(ydl_opts)
+                    if ydl_opts.get("cookiefile"):
+                        # Load the jar now, while no other job can be rewriting the file.
+                        with COOKIE_FILE_LOCK:
+                            ydl.cookiejar
+                    ydl.add_progress_hook(forward_progress)
+                    downloaders[cookie_key] = ydl
+
+                extractor_args = strategy.get("extractor_args")
+                if extractor_args:
+                    ydl.params["extractor_args"] = extractor_args
+                else:
+                    ydl.params.pop("extractor_args", None)
+
+                # Extract once, pick the format from that metadata and let yt-dlp
+                # process the same result instead of probing the URL a second time.
+                extracted = ydl.extract_info(url, download=False, process=False)
+                selected_format, format_strategy = choose_download_format(extracted)
+                ydl.format_selector = ydl.build_format_selector(selected_format)
+
+                strategy_name = f"{strategy['name']} | {format_strategy}"
+                current_hook[:] = [create_progress_hook(progress, task_id, strategy_name)]
+                progress.update(
+                    task_id,
+                    description=f"[cyan]Starting download ({strategy_name})[/cyan]",
+                    percent="  0.0%",
+                    speed="-",
+                    eta="-",
+                    total=100,
+                    completed=0,
+                )
+                info = ydl.process_ie_result(extracted, download=True)
+            except Exception as exc:
+                last_error = summarize_exception(exc)
+                progress.update(
+                    task_id,
+                    description=f"[yellow]Retrying with next strategy after error: {last_error}[/yellow]",
+                    percent="  0.0%",
+                    speed="-",
+                    eta="-",
+                    total=100,
+                    completed=0,
+                )
+                continue
 
-        if output_file.stat().st_size < 10_000:
-            last_error = f"downloaded file was too small: {output_file.name}"
-            output_file.unlink(missing_ok=True)
-            continue
+            # Prefer the path yt-dlp reported: with parallel downloads the folder diff
+            # can also contain files that belong to other queue entries.
+            output_file = resolve_output_from_info(info)
+            if output_file is None:
+                with OUTPUT_SCAN_LOCK:
+                    new_files = find_new_video_files(before)
+                output_file = new_files[0] if new_files else None
+            if output_file is None:
+                last_error = "yt-dlp finished but no output file was created"
+                continue
 
-        title = output_file.stem
-        if isinstance(info, dict):
-            title = str(info.get("title") or title)
-        progress.update(
-            task_id,
-            total=100,
-            completed=100,
-            description=f"[green]Finished: {output_file.name}[/green]",
-            percent="100.0%",
-            speed="-",
-            eta="-",
-        )
-        return DownloadResult(
-            url=url,
-            success=True,
-            title=title,
-            output_file=output_file,
-            strategy=strategy_name,
-            error="",
-        )
+            if output_file.stat().st_size < 10_000:
+                last_error = f"downloaded file was too small: {output_file.name}"
+                output_file.unlink(missing_ok=True)
+                continue
+
+            title = output_file.stem
+            if isinstance(info, dict):
+                title = str(info.get("title") or title)
+            progress.update(
+                task_id,
+                total=100,
+                completed=100,
+                description=f"[green]Finished: {output_file.name}[/green]",
+                percent="100.0%",
+                speed="-",
+                eta="-",
+            )
+            return DownloadResult(
+                url=url,
+                success=True,
+                title=title,
+                output_file=output_file,
+                strategy=strategy_name,
+                error="",
+            )
+    finally:
+        for ydl in downloaders.values():
+            try:
+                with COOKIE_FILE_LOCK:
+                    ydl.close()
+            except Exception:
+                pass
 
     return DownloadResult(
         url=url,
@@ -615,7 +789,7 @@ def render_runtime_table(cookie_source: CookieSource, ffmpeg_found: bool) -> Tab
     table = Table(title="Runtime")
     table.add_column("Setting", style="cyan")
     table.add_column("Value", style="white")
-    table.add_row("Output folder", str(OUTPUT_DIR.resolve()))
+    table.add_row("Output folder", os.fspath(OUTPUT_DIR))
     table.add_row("Cookie mode", cookie_source.description)
     table.add_row("ffmpeg in PATH", "yes" if ffmpeg_found else "no (required for reliable mp4 merging)")
     return table
@@ -661,16 +835,15 @@ def run() -> int:
 
     ffmpeg_found = shutil.which("ffmpeg") is not None
     with console.status("[bold cyan]Detecting cookie source...[/bold cyan]"):
-        cookie_source = detect_cookie_source()
+        cookie_source = detect_cookie_source(refresh=args.refresh_cookies)
     console.print(render_runtime_table(cookie_source, ffmpeg_found))
 
     try:
-        raw_input = collect_raw_input(console, args)
+        urls = collect_urls(console, args)
     except FileNotFoundError as exc:
         console.print(f"[red]{exc}[/red]")
         return 1
 
-    urls = extract_urls(raw_input)
     if not urls:
         console.print("[red]No valid YouTube video links were found.[/red]")
         return 1
@@ -680,40 +853,67 @@ def run() -> int:
         console.print("Canceled.")
         return 0
 
-    results: List[DownloadResult] = []
     total = len(urls)
-    for index, url in enumerate(urls, start=1):
-        console.print(f"[bold]Video {index}/{total}[/bold] {url}")
-        with Progress(
-            TextColumn("{task.description}"),
-            BarColumn(bar_width=40),
-            TextColumn("[bold]{task.fields[percent]}[/bold]"),
-            TextColumn("speed: {task.fields[speed]}"),
-            TextColumn("eta: {task.fields[eta]}"),
-            console=console,
-            expand=True,
-        ) as progress:
+    results: Dict[int, DownloadResult] = {}
+    with Progress(
+        TextColumn("[bold]{task.fields[label]}[/bold]"),
+        TextColumn("{task.description}"),
+        BarColumn(bar_width=40),
+        TextColumn("[bold]{task.fields[percent]}[/bold]"),
+        TextColumn("speed: {task.fields[speed]}"),
+        TextColumn("eta: {task.fields[eta]}"),
+        console=console,
+        expand=True,
+    ) as progress:
+
+        def download_job(index: int, url: str) -> DownloadResult:
+            # Rows only exist while a download runs, so long queues do not flood the terminal.
             task_id = progress.add_task(
                 "[cyan]Preparing...[/cyan]",
                 total=100,
                 completed=0,
+                label=f"{index + 1}/{total}",
                 percent="  0.0%",
                 speed="-",
                 eta="-",
             )
-            result = download_video(url, cookie_source, progress, task_id)
-        results.append(result)
-        if result.success and result.output_file:
-            console.print(f"[green]OK[/green] {result.title} -> {result.output_file.name}")
-        else:
-            console.print(f"[red]FAILED[/red] {url} -> {result.error}")
-
-    success_count = sum(1 for result in results if result.success)
+            try:
+                return download_video(url, cookie_source, progress, task_id)
+            finally:
+                progress.remove_task(task_id)
+
+        executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_DOWNLOADS, total))
+        try:
+            futures = {executor.submit(download_job, index, url): index for index, url in enumerate(urls)}
+            pending = set(futures)
+            while pending:
+                # An untimed wait cannot be interrupted on Windows before Python 3.14, so
+                # poll to let Ctrl+C through while long downloads are still running.
+                done, pending = wait(pending, timeout=RESULT_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = futures[future]
+                    result = future.result()
+                    results[index] = result
+                    if result.success and result.output_file:
+                        progress.console.print(f"[green]OK[/green] {result.title} -> {result.output_file.name}")
+                    else:
+                        progress.console.print(f"[red]FAILED[/red] {result.url} -> {result.error}")
+        except BaseException:
+            # Any early exit (Ctrl+C or an unexpected error from a job) must stop the
+            # running downloads and drop the queued ones instead of leaving them to
+            # finish at interpreter exit.
+            STOP_DOWNLOADS.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        executor.shutdown()
+
+    ordered_results = [results[index] for index in range(total)]
+    success_count = sum(1 for result in ordered_results if result.success)
     failed_count = total - success_count
 
-    console.print(render_results_table(results))
+    console.print(render_results_table(ordered_results))
     console.print(f"Completed. Success: {success_count} | Failed: {failed_count}")
-    console.print(f"Output folder: {OUTPUT_DIR.resolve()}")
+    console.print(f"Output folder: {OUTPUT_DIR}")
 
     if success_count == 0:
         return 1
@@ -3,20 +3,31 @@
 import argparse
 import hashlib
 import json
+import mmap
+import os
 import shutil
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from importlib import metadata
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-BASE_DIR = Path(__file__).resolve().parent
+BASE_DIR = Path(__file__).parent
 SYSTEM_DIR = BASE_DIR / "system"
 STATE_FILE = SYSTEM_DIR / "setup_state.json"
 REQUIREMENTS_FILE = BASE_DIR / "requirements.txt"
+TOOLCHAIN_PACKAGES = ("pip", "setuptools", "wheel")
+
+# Parsed results keyed by the (st_mtime_ns, st_size) of the file they came from.
+_STATE_CACHE: Optional[Tuple[Tuple[int, int], Dict[str, Any]]] = None
+_REQUIREMENTS_HASH_CACHE: Optional[Tuple[Tuple[int, int], str]] = None
 
 
 def run_cmd(args: list[str]) -> subprocess.CompletedProcess:
-    return subprocess.run(args, check=True, text=True)
+    # pip writes straight to the inherited terminal; its output is never read here.
+    return subprocess.run(args, check=True, stdout=None, stderr=None)
 
 
 def pip_install(args: list[str]) -> None:
@@ -24,21 +35,133 @@ def pip_install(args: list[str]) -> None:
 
 
 def read_state() -> Dict[str, Any]:
-    if not STATE_FILE.exists():
+    global _STATE_CACHE
+    try:
+        state_stat = STATE_FILE.stat()
+    except OSError:
         return {}
+    cache_key = (state_stat.st_mtime_ns, state_stat.st_size)
+    if _STATE_CACHE is not None and _STATE_CACHE[0] == cache_key:
+        return dict(_STATE_CACHE[1])
+
     try:
-        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+        state = json.loads(STATE_FILE.read_text(encoding="utf-8"))
     except Exception:
         return {}
+    if not isinstance(state, dict):
+        return {}
+    _STATE_CACHE = (cache_key, state)
+    return dict(state)
 
 
-def write_state(state: Dict[str, Any]) -> None:
+@lru_cache(maxsize=1)
+def _ensure_system_dir() -> None:
     SYSTEM_DIR.mkdir(parents=True, exist_ok=True)
-    STATE_FILE.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+
+def write_state(state: Dict[str, Any]) -> None:
+    _ensure_system_dir()
+    tmp_file = STATE_FILE.with_name(f"{STATE_FILE.name}.tmp")
+    tmp_file.write_bytes(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+    os.replace(tmp_file, STATE_FILE)
 
 
 def requirements_hash() -> str:
-    return hashlib.sha256(REQUIREMENTS_FILE.read_bytes()).hexdigest()
+    global _REQUIREMENTS_HASH_CACHE
+    req_stat = REQUIREMENTS_FILE.stat()
+    cache_key = (req_stat.st_mtime_ns, req_stat.st_size)
+    if _REQUIREMENTS_HASH_CACHE is not None and _REQUIREMENTS_HASH_CACHE[0] == cache_key:
+        return _REQUIREMENTS_HASH_CACHE[1]
+
+    hasher = hashlib.blake2b(digest_size=16)
+    # mmap hands the page cache straight to the hash; it cannot map an empty file.
+    if req_stat.st_size:
+        with REQUIREMENTS_FILE.open("rb") as handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            hasher.update(mapped)
+    digest = hasher.hexdigest()
+    _REQUIREMENTS_HASH_CACHE = (cache_key, digest)
+    return digest
+
+
+def current_requirements_hash(state: Dict[str, Any], req_stat: os.stat_result) -> str:
+    # An unchanged mtime and size means the hash recorded last time still applies.
+    if state.get("requirements_mtime_ns") == req_stat.st_mtime_ns and state.get("requirements_size") == req_stat.st_size:
+        cached_hash = state.get("requirements_blake2b")
+        if isinstance(cached_hash, str) and cached_hash:
+            return cached_hash
+    return requirements_hash()
+
+
+def toolchain_versions() -> Dict[str, str]:
+    versions: Dict[str, str] = {}
+    for name in TOOLCHAIN_PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = ""
+    return versions
+
+
+def requirement_lines() -> List[str]:
+    lines: List[str] = []
+    pending = ""
+    for raw_line in REQUIREMENTS_FILE.read_text(encoding="utf-8").splitlines():
+        line = raw_line.split("#", 1)[0].rstrip()
+        if line.endswith("\\"):
+            pending += f"{line[:-1]} "
+            continue
+        line = f"{pending}{line}".strip()
+        pending = ""
+        if line:
+            lines.append(line)
+    if pending.strip():
+        lines.append(pending.strip())
+    return lines
+
+
+def requirements_pinned(lines: List[str]) -> bool:
+    # Fully hashed requirements (e.g. from pip-compile --generate-hashes) already list
+    # every dependency, so pip can install them without running its resolver.
+    if not lines:
+        return False
+    return all(not line.startswith("-") and "--hash" in line for line in lines)
+
+
+def requirements_already_satisfied(lines: List[str]) -> bool:
+    # packaging arrives with wheel; without it, leave the decision to pip.
+    try:
+        from packaging.requirements import InvalidRequirement, Requirement
+    except ImportError:
+        return False
+
+    for line in lines:
+        if line.startswith("-"):
+            return False
+        try:
+            requirement = Requirement(line.split("--hash", 1)[0].strip())
+        except InvalidRequirement:
+            return False
+        if requirement.marker is not None and not requirement.marker.evaluate():
+            continue
+        if requirement.url or requirement.extras:
+            return False
+        try:
+            installed_version = metadata.version(requirement.name)
+        except metadata.PackageNotFoundError:
+            return False
+        if not requirement.specifier.contains(installed_version, prereleases=True):
+            return False
+    return True
+
+
+def prepared_state(req_hash: str, req_stat: os.stat_result) -> Dict[str, Any]:
+    return {
+        "python_executable": sys.executable,
+        "requirements_blake2b": req_hash,
+        "requirements_mtime_ns": req_stat.st_mtime_ns,
+        "requirements_size": req_stat.st_size,
+        "toolchain": toolchain_versions(),
+    }
 
 
 def running_in_venv() -> bool:
@@ -48,10 +171,14 @@ def running_in_venv() -> bool:
 def should_skip_setup(state: Dict[str, Any], req_hash: str, force: bool) -> bool:
     if force:
         return False
-    if state.get("requirements_hash") != req_hash:
+    if state.get("requirements_blake2b") != req_hash:
         return False
     if state.get("python_executable") != sys.executable:
         return False
+    # Last on purpose: the metadata lookups scan sys.path, which makes this the
+    # most expensive check on the warm path.
+    if state.get("toolchain") != toolchain_versions():
+        return False
     return True
 
 
@@ -59,11 +186,21 @@ def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Prepare Python environment for MP4 Downloader.")
     parser.add_argument("--force", action="store_true", help="Force reinstall even if setup state matches.")
     parser.add_argument("--skip-pip-upgrade", action="store_true", help="Skip pip self-upgrade.")
+    parser.add_argument(
+        "--check-only",
+        action="store_true",
+        help="Only check external tools such as ffmpeg; never run pip.",
+    )
     return parser.parse_args()
 
 
-def check_external_tools() -> None:
-    ffmpeg_found = shutil.which("ffmpeg") is not None
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def check_external_tools(ffmpeg_found: Optional[bool] = None) -> None:
+    if ffmpeg_found is None:
+        ffmpeg_found = ffmpeg_available()
     if not ffmpeg_found:
         print("Warning: ffmpeg not found in PATH. Merging/conversion to MP4 may fail.")
 
@@ -71,41 +208,63 @@ def check_external_tools() -> None:
 def main() -> int:
     args = parse_args()
 
-    if not REQUIREMENTS_FILE.exists():
-        print(f"Error: requirements file not found: {REQUIREMENTS_FILE}")
+    if args.check_only:
+        check_external_tools()
+        return 0
+
+    try:
+        req_stat = REQUIREMENTS_FILE.stat()
+    except FileNotFoundError:
+        print(f"Error: requirements file not found: {REQUIREMENTS_FILE.resolve()}")
         return 1
 
     if not running_in_venv():
         print("Warning: no virtual environment detected. Continuing anyway.")
 
-    req_hash = requirements_hash()
     state = read_state()
+    req_hash = current_requirements_hash(state, req_stat)
 
     if should_skip_setup(state, req_hash, force=args.force):
         print("Environment already prepared. Skipping dependency install.")
         check_external_tools()
         return 0
 
-    try:
-        if not args.skip_pip_upgrade:
-            print("Upgrading pip...")
-            pip_install(["install", "--upgrade", "pip"])
+    lines = requirement_lines()
+    if not args.force and requirements_already_satisfied(lines):
+        write_state(prepared_state(req_hash, req_stat))
+        print("Installed packages already satisfy requirements. Skipping dependency install.")
+        check_external_tools()
+        return 0
 
+    # --prefer-binary keeps pip on (cached) wheels where one is available, and
+    # installing wheel lets pip build and cache wheels for sdist-only dependencies.
+    install_args = ["install", "--prefer-binary"]
+    if requirements_pinned(lines):
+        # Unhashed toolchain packages cannot join a --require-hashes install.
+        print("Installing pinned project requirements...")
+        install_args += ["--no-deps", "--require-hashes"]
+    elif args.skip_pip_upgrade:
         print("Installing project requirements...")
-        pip_install(["install", "-r", str(REQUIREMENTS_FILE)])
-    except subprocess.CalledProcessError as exc:
-        print(f"Dependency installation failed. Command: {' '.join(exc.cmd)}")
-        return exc.returncode or 1
-
-    write_state(
-        {
-            "python_executable": sys.executable,
-            "requirements_hash": req_hash,
-        }
-    )
+        install_args += [name for name in TOOLCHAIN_PACKAGES if name != "pip"]
+    else:
+        print("Upgrading pip/setuptools/wheel and installing project requirements...")
+        install_args += ["--upgrade", *TOOLCHAIN_PACKAGES]
+    install_args += ["-r", str(REQUIREMENTS_FILE)]
+
+    # The PATH scan for ffmpeg is independent of pip, so run it while pip works.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        ffmpeg_lookup = executor.submit(ffmpeg_available)
+        try:
+            pip_install(install_args)
+        except subprocess.CalledProcessError as exc:
+            print(f"Dependency installation failed. Command: {' '.join(exc.cmd)}")
+            check_external_tools(ffmpeg_lookup.result())
+            return exc.returncode or 1
+
+    write_state(prepared_state(req_hash, req_stat))
 
     print("Environment setup complete.")
-    check_external_tools()
+    check_external_tools(ffmpeg_lookup.result())
     return 0
 
 